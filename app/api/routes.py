@@ -2,15 +2,16 @@
 API route handlers for swimming OCR application
 """
 
-import tempfile
 import uuid
 import logging
+from typing import Any, Dict, List, Optional, Tuple
 
 import cv2
 import numpy as np
 
 from fastapi import APIRouter, File, UploadFile, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
 
 from ..helpers.utils import validate_image_file
 from ..helpers.storage import storage
@@ -20,6 +21,24 @@ from ..image_processing.image_splitter import split_image_into_segments
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Segment PNGs are transient previews; favour encode speed over file size
+SEGMENT_PNG_PARAMS = [cv2.IMWRITE_PNG_COMPRESSION, 1]
+
+
+def _decode_and_split(data: np.ndarray) -> Tuple[Optional[np.ndarray], List[np.ndarray], List[Dict[str, Any]]]:
+    """Decode an uploaded image and split it into segments (CPU-bound, runs in the threadpool)"""
+    image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+    if image is None:
+        return None, [], []
+    segment_images, segment_info = split_image_into_segments(image)
+    return image, segment_images, segment_info
+
+
+def _encode_png(image: np.ndarray) -> bytes:
+    """Encode a segment image as PNG (CPU-bound, runs in the threadpool)"""
+    _, buffer = cv2.imencode('.png', image, SEGMENT_PNG_PARAMS)
+    return buffer.tobytes()
+
 
 @router.get("/healthz")
 async def health_check():
@@ -36,24 +55,22 @@ async def split_image(file: UploadFile = File(...)):
         # Read image
         contents = await file.read()
         nparr = np.frombuffer(contents, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+        # Decode and split off the event loop; OpenCV releases the GIL
+        image, segment_images, segment_info = await run_in_threadpool(_decode_and_split, nparr)
         
         if image is None:
             raise HTTPException(status_code=400, detail="Could not decode image")
         
-        # Split image
-        segment_images, segment_info = split_image_into_segments(image)
-        
         if not segment_images:
             raise HTTPException(status_code=400, detail="No segments found in image")
         
         # Generate IDs
-        split_id = str(uuid.uuid4())
+        split_id = uuid.uuid4().hex
         
-        # Store segment images
+        # Store segment images as arrays; PNG encoding only happens on download
         for i, (seg_img, seg_info) in enumerate(zip(segment_images, segment_info)):
-            _, buffer = cv2.imencode('.png', seg_img)
-            storage.store_segment(f"{split_id}_{i}", buffer.tobytes(), seg_info)
+            storage.store_segment(f"{split_id}_{i}", seg_img, seg_info)
         
         return {
             "split_id": split_id,
@@ -72,16 +89,12 @@ async def get_segment_image(segment_id: str):
     """Get individual segment image"""
     try:
         segment_data = storage.get_segment(segment_id)
-        image_bytes = segment_data["image"]
-        
-        temp_file = tempfile.NamedTemporaryFile(suffix='.png', delete=False)
-        temp_file.write(image_bytes)
-        temp_file.close()
+        image_bytes = await run_in_threadpool(_encode_png, segment_data["image"])
         
-        return FileResponse(
-            temp_file.name,
+        return Response(
+            content=image_bytes,
             media_type="image/png",
-            filename=f"segment_{segment_id}.png"
+            headers={"Content-Disposition": f'attachment; filename="segment_{segment_id}.png"'}
         )
     except KeyError:
         raise HTTPException(status_code=404, detail="Segment not found")
@@ -94,27 +107,18 @@ async def ocr_individual_segment(segment_id: str):
 
     try:
         segment_data = storage.get_segment(segment_id)
-        image_bytes = segment_data["image"]
+        segment_image = segment_data["image"]
         info = segment_data["info"]
 
         logger.debug(f"   Segment info: {info}")
-        logger.debug(f"   Image size: {len(image_bytes)} bytes")
-
-        # Decode image
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        segment_image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-        if segment_image is None:
-            logger.error(f"❌ API: Failed to decode image for segment {segment_id}")
-            raise HTTPException(status_code=400, detail="Could not decode segment image")
-
-        logger.debug(f"   Decoded image shape: {segment_image.shape}")
+        logger.debug(f"   Image shape: {segment_image.shape}")
 
         # OCR the segment with proper lap numbering
         start_lap = info.get("start_lap", 1)
         logger.info(f"   Calling OCR with start_lap={start_lap}, segment_id={info['segment_id']}")
 
-        segment = ocr_single_segment(segment_image, info["segment_id"], start_lap)
+        # tesseract runs in subprocesses; keep the event loop free so segments can be OCR'd concurrently
+        segment = await run_in_threadpool(ocr_single_segment, segment_image, info["segment_id"], start_lap)
 
         # Check if we got default fallback values
         laps = segment.get("laps", [])
@@ -4,5 +4,6 @@ Helper utilities for the swimming OCR application
 
 from .utils import seconds_to_mmss, validate_image_file
 from .storage import StorageManager
+from .jit import njit, NUMBA_AVAILABLE
 
-__all__ = ['seconds_to_mmss', 'validate_image_file', 'StorageManager']
+__all__ = ['seconds_to_mmss', 'validate_image_file', 'StorageManager', 'njit', 'NUMBA_AVAILABLE']
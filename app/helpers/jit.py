@@ -0,0 +1,15 @@
+"""
+Optional Numba JIT support
+"""
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:  # numba is optional; callers keep a pure NumPy path
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """No-op stand-in for numba.njit when numba is not installed"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
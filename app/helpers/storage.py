@@ -2,41 +2,62 @@
 In-memory storage management for the application
 """
 
+from collections import OrderedDict
 from typing import Dict, Any, List
 import uuid
 
+import numpy as np
+
+# Segment arrays are evicted least-recently-used first once they exceed this budget
+MAX_SEGMENT_BYTES = 256 * 1024 * 1024
+MAX_CSV_ENTRIES = 256
+
 
 class StorageManager:
-    """Manages in-memory storage for CSV data and segments"""
-    
-    def __init__(self):
-        self.csv_storage: Dict[str, List[Dict[str, Any]]] = {}
-        self.segment_storage: Dict[str, Dict[str, Any]] = {}
-    
+    """Manages bounded in-memory LRU storage for CSV data and segments"""
+
+    def __init__(self, max_segment_bytes: int = MAX_SEGMENT_BYTES, max_csv_entries: int = MAX_CSV_ENTRIES):
+        self.csv_storage: OrderedDict[str, List[Dict[str, Any]]] = OrderedDict()
+        self.segment_storage: OrderedDict[str, Dict[str, Any]] = OrderedDict()
+        self.max_segment_bytes = max_segment_bytes
+        self.max_csv_entries = max_csv_entries
+        self.segment_bytes = 0
+
     def store_csv(self, data: List[Dict[str, Any]]) -> str:
         """Store CSV data and return ID"""
-        csv_id = str(uuid.uuid4())
+        csv_id = uuid.uuid4().hex
         self.csv_storage[csv_id] = data
+        while len(self.csv_storage) > self.max_csv_entries:
+            self.csv_storage.popitem(last=False)
         return csv_id
-    
+
     def get_csv(self, csv_id: str) -> List[Dict[str, Any]]:
         """Get CSV data by ID"""
         if csv_id not in self.csv_storage:
             raise KeyError("CSV not found")
+        self.csv_storage.move_to_end(csv_id)
         return self.csv_storage[csv_id]
-    
-    
-    def store_segment(self, segment_id: str, image_bytes: bytes, info: Dict[str, Any]) -> None:
-        """Store segment image and info"""
+
+
+    def store_segment(self, segment_id: str, image: np.ndarray, info: Dict[str, Any]) -> None:
+        """Store segment image (decoded BGR array, not re-encoded) and info"""
+        if segment_id in self.segment_storage:
+            self.segment_bytes -= self.segment_storage.pop(segment_id)["image"].nbytes
         self.segment_storage[segment_id] = {
-            "image": image_bytes,
+            "image": image,
             "info": info
         }
-    
+        self.segment_bytes += image.nbytes
+        # Always keep the newest segment, even if it alone exceeds the budget
+        while self.segment_bytes > self.max_segment_bytes and len(self.segment_storage) > 1:
+            _, evicted = self.segment_storage.popitem(last=False)
+            self.segment_bytes -= evicted["image"].nbytes
+
     def get_segment(self, segment_id: str) -> Dict[str, Any]:
         """Get segment data by ID"""
         if segment_id not in self.segment_storage:
             raise KeyError("Segment not found")
+        self.segment_storage.move_to_end(segment_id)
         return self.segment_storage[segment_id]
 
 
@@ -2,7 +2,7 @@
 Image processing functionality for swimming data extraction
 """
 
-from .preprocessing import preprocess_for_small_text
+from .preprocessing import preprocess_for_small_text, get_clahe
 from .lap_detection import (
     detect_lap_boundaries,
     analyze_actual_lap_structure,
@@ -14,6 +14,7 @@ from .image_splitter import (
 
 __all__ = [
     'preprocess_for_small_text',
+    'get_clahe',
     'detect_lap_boundaries',
     'analyze_actual_lap_structure', 
     'detect_optimal_segments',
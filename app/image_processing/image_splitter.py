@@ -3,17 +3,191 @@ Image splitting functionality for segmenting swimming data
 """
 
 import math
+from functools import lru_cache
 from typing import List, Dict, Any, Tuple
 import cv2
 import numpy as np
 from scipy.signal import find_peaks
-from scipy.ndimage import gaussian_filter1d
+
+from ..helpers.jit import njit, NUMBA_AVAILABLE
+from .preprocessing import get_clahe
+
+# Below this height a crop holds too few laps for valley detection to pay off
+MIN_DETECTION_HEIGHT = 300
+# Projection std below this means a featureless (blank/uniform) image
+FLAT_PROJECTION_STD = 1e-3
+# Vertical opening that drops 1-2 px specks before projecting rows
+_OPEN_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (1, 3))
+
+
+@lru_cache(maxsize=32)
+def _gaussian_row_kernel(sigma: float) -> np.ndarray:
+    """1 x ksize Gaussian kernel matching scipy's gaussian_filter1d (truncate=4)"""
+    ksize = 2 * int(4.0 * sigma + 0.5) + 1
+    kernel = cv2.getGaussianKernel(ksize, sigma, cv2.CV_64F).reshape(1, -1)
+    kernel.setflags(write=False)  # shared between calls
+    return kernel
+
+
+@njit(cache=True)
+def _sorted_quantile(sorted_values: np.ndarray, q: float) -> float:
+    """Linear-interpolated quantile of an already sorted array (matches np.percentile)"""
+    pos = q * (sorted_values.size - 1)
+    lo = int(pos)
+    hi = min(lo + 1, sorted_values.size - 1)
+    return float(sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo))
+
+
+@njit(cache=True)
+def _robust_median_interval(boundaries: np.ndarray) -> float:
+    """
+    Median gap between boundaries after dropping IQR outliers (1.5 * IQR fences).
+
+    One sort serves both quartiles and the median: the fences keep a contiguous
+    run of the sorted gaps. Plain NumPy calls only, so it also runs un-jitted.
+    """
+    diffs = np.sort(np.diff(boundaries).astype(np.float64))
+    q1 = _sorted_quantile(diffs, 0.25)
+    q3 = _sorted_quantile(diffs, 0.75)
+    iqr = q3 - q1
+    lo = np.searchsorted(diffs, q1 - 1.5 * iqr, side="left")
+    hi = np.searchsorted(diffs, q3 + 1.5 * iqr, side="right")
+    if hi > lo:
+        return _sorted_quantile(diffs[lo:hi], 0.5)
+    return _sorted_quantile(diffs, 0.5)
+
+
+def _median_interval(boundaries: np.ndarray) -> int:
+    if len(boundaries) < 3:
+        return 0
+    return max(1, int(round(_robust_median_interval(boundaries))))
+
+
+@njit(cache=True)
+def _merge_close(sorted_positions: np.ndarray, min_sep: int) -> np.ndarray:
+    """
+    Collapse positions closer than min_sep to their predecessor, keeping the later one.
+    """
+    n = sorted_positions.shape[0]
+    out = np.empty(n, dtype=np.int32)
+    if n == 0:
+        return out
+    out[0] = sorted_positions[0]
+    k = 0
+    for i in range(1, n):
+        y = sorted_positions[i]
+        if y - out[k] < min_sep:
+            out[k] = y  # keep later one
+        else:
+            k += 1
+            out[k] = y
+    return out[:k + 1].copy()
+
+
+@njit(cache=True)
+def _repair_long_intervals_jit(boundaries: np.ndarray, proj_sm: np.ndarray, est_h: int) -> np.ndarray:
+    """
+    Compiled scalar version of _repair_long_intervals.
+
+    Walks the intervals left to right and splits each oversize one depth-first
+    (left half before right), using a stack of pending right endpoints.
+    """
+    h = proj_sm.shape[0]
+    max_len = int(round(1.35 * est_h))
+    margin = int(0.20 * est_h)
+
+    # every split is >= 4 px from its interval's ends, so h // 4 extra slots suffice
+    cap = boundaries.shape[0] + h // 4 + 2
+    out = np.empty(cap, dtype=np.int32)
+    pending = np.empty(cap, dtype=np.int32)
+    out[0] = boundaries[0]
+    n = 1
+
+    for i in range(1, boundaries.shape[0]):
+        pending[0] = boundaries[i]
+        top = 1
+        while top > 0:
+            y0 = out[n - 1]
+            y1 = pending[top - 1]
+            span = y1 - y0
+            if span > max_len and top < cap and n < cap - 1:
+                a = y0 + margin
+                b = y1 - margin
+                if b <= a:
+                    a = y0 + span // 3
+                    b = y1 - span // 3
+                lo = max(0, a)
+                hi = min(h, b)
+                if hi > lo:
+                    split_y = min(max(a + np.argmin(proj_sm[lo:hi]), y0 + 4), y1 - 4)
+                else:
+                    split_y = y0 + int(round(est_h))
+                pending[top] = split_y
+                top += 1
+            else:
+                out[n] = y1
+                n += 1
+                top -= 1
+
+    return out[:n].copy()
+
+
+def _repair_long_intervals(boundaries: np.ndarray, proj_sm: np.ndarray, est_h: int) -> np.ndarray:
+    """
+    Insert missing boundaries into every interval longer than 1.35 * est_h.
+
+    Each pass splits all oversize gaps at once (at the projection minimum
+    inside the gap) and merges the new splits with a single sort; passes
+    repeat until no gap is too long, which usually takes one or two.
+    Uses the compiled scalar loop instead when numba is installed.
+    """
+    if NUMBA_AVAILABLE:
+        return _repair_long_intervals_jit(boundaries.astype(np.int32), proj_sm, int(est_h))
+
+    h = proj_sm.shape[0]
+    max_len = int(round(1.35 * est_h))
+    margin = int(0.20 * est_h)
+
+    while True:
+        spans = np.diff(boundaries)
+        long_idx = np.flatnonzero(spans > max_len)
+        if long_idx.size == 0:
+            return boundaries
+
+        y0 = boundaries[long_idx]
+        y1 = boundaries[long_idx + 1]
+        span = spans[long_idx]
+        a = y0 + margin
+        b = y1 - margin
+        narrow = b <= a
+        a = np.where(narrow, y0 + span // 3, a)
+        b = np.where(narrow, y1 - span // 3, b)
+
+        splits = []
+        for y0_i, y1_i, a_i, b_i in zip(y0.tolist(), y1.tolist(), a.tolist(), b.tolist()):
+            window = proj_sm[max(0, a_i):min(h, b_i)]
+            if window.size > 0:
+                offset = int(np.argmin(window))
+                splits.append(int(np.clip(a_i + offset, y0_i + 4, y1_i - 4)))
+            else:
+                splits.append(int(y0_i + round(est_h)))
+
+        boundaries = np.sort(np.concatenate((boundaries, np.asarray(splits, dtype=boundaries.dtype))))
+
+
+if NUMBA_AVAILABLE:
+    # compile (or load from the on-disk cache) at import instead of on the first request
+    _repair_long_intervals_jit(np.array([0, 100], dtype=np.int32), np.zeros(100, dtype=np.float32), 20)
+    _merge_close(np.array([0, 100], dtype=np.int32), 2)
+    _robust_median_interval(np.array([0, 50, 100], dtype=np.int32))
+
 
 def split_image_into_segments(
     image: np.ndarray,
     laps_per_segment: int = 5,
     extra_top_padding_px: int = 12,     # manual tweak knob (>=0)
     extra_bottom_padding_px: int = 8,   # manual tweak knob (>=0)
+    use_clahe: bool = True,             # skip contrast normalization for clean, high-contrast inputs
 ) -> Tuple[List[np.ndarray], List[Dict[str, Any]]]:
     """
     Robust, size-adaptive lap splitter with guaranteed visual padding.
@@ -30,119 +204,96 @@ def split_image_into_segments(
 
     # ---------- helpers ----------
     def _normalize_contrast(gray: np.ndarray) -> np.ndarray:
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        return clahe.apply(gray)
+        return get_clahe(2.0).apply(gray)
 
     def _binarize(gray: np.ndarray) -> np.ndarray:
-        blur = cv2.GaussianBlur(gray, (3, 3), 0)
+        # one working buffer reused by every stage instead of a fresh image per step
+        buf = np.empty_like(gray)
+        cv2.GaussianBlur(gray, (3, 3), 0, dst=buf)
         # invert so bright UI text/lines become white
-        _, th = cv2.threshold(255 - blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        th = cv2.morphologyEx(
-            th,
+        cv2.bitwise_not(buf, dst=buf)
+        cv2.threshold(buf, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=buf)
+        cv2.morphologyEx(
+            buf,
             cv2.MORPH_OPEN,
-            cv2.getStructuringElement(cv2.MORPH_RECT, (1, 3)),
-            1,
+            _OPEN_KERNEL,
+            dst=buf,
+            iterations=1,
         )
-        return th
+        return buf
 
     def _row_projection(bin_img: np.ndarray, sigma: float) -> np.ndarray:
-        proj = bin_img.sum(axis=1).astype(np.float32)
-        return gaussian_filter1d(proj, sigma=sigma)
-
-    def _detect_valleys(proj_sm: np.ndarray, min_distance_px: int, prom_ratio: float) -> np.ndarray:
-        inv = -proj_sm
-        prominence = max(1.0, float(np.std(proj_sm) * prom_ratio))
-        valleys, _ = find_peaks(inv, distance=max(2, int(min_distance_px)), prominence=prominence)
-        return valleys.astype(int)
-
-    def _merge_close(sorted_positions: np.ndarray, min_sep: int) -> np.ndarray:
-        if sorted_positions.size == 0:
-            return sorted_positions
-        out = [int(sorted_positions[0])]
-        for y in sorted_positions[1:]:
-            if y - out[-1] < min_sep:
-                out[-1] = int(y)  # keep later one
-            else:
-                out.append(int(y))
-        return np.array(out, dtype=int)
-
-    def _median_interval(boundaries: np.ndarray) -> int:
-        if len(boundaries) < 3:
-            return 0
-        diffs = np.diff(boundaries).astype(float)
-        q1, q3 = np.percentile(diffs, [25, 75])
-        iqr = q3 - q1
-        keep = diffs[(diffs >= q1 - 1.5 * iqr) & (diffs <= q3 + 1.5 * iqr)]
-        if keep.size == 0:
-            keep = diffs
-        return max(1, int(round(np.median(keep))))
+        # accumulate in uint32 (255 * width always fits) instead of NumPy's default int64
+        proj = bin_img.sum(axis=1, dtype=np.uint32).astype(np.float64)
+        # same kernel as scipy's gaussian_filter1d (truncate=4, reflect border); laid out
+        # as a single row and applied with filter2D, which skips GaussianBlur's
+        # separable-filter setup for what is a single 1-D pass. Accumulating in float64
+        # and rounding once at the end reproduces scipy's float32 output exactly
+        return cv2.filter2D(
+            proj.reshape(1, -1), cv2.CV_64F, _gaussian_row_kernel(sigma), borderType=cv2.BORDER_REFLECT,
+        ).ravel().astype(np.float32)
+
+    def _detect_valleys(proj_neg: np.ndarray, proj_std: float, min_distance_px: int, prom_ratio: float) -> np.ndarray:
+        prominence = max(1.0, float(proj_std * prom_ratio))
+        valleys, _ = find_peaks(proj_neg, distance=max(2, int(min_distance_px)), prominence=prominence)
+        return valleys.astype(np.int32)
+
+    def _uniform_boundaries(height: int) -> Tuple[np.ndarray, int]:
+        # ~30 px per lap for crops too short to be worth detecting
+        n = max(2, height // 30 + 1)
+        return np.linspace(0, height, n, dtype=np.int32), max(1, int(round(height / (n - 1))))
+
+    def _detect_boundaries(gray: np.ndarray) -> Tuple[np.ndarray, int]:
+        h = gray.shape[0]
+        if use_clahe:
+            gray = _normalize_contrast(gray)
+        bin_img = _binarize(gray)
+
+        sigma = max(2.0, h / 900.0)  # scale smoothing with height
+        proj_sm = _row_projection(bin_img, sigma=sigma)
+        proj_std = float(np.std(proj_sm))
+
+        # initial valleys (coarse); a featureless projection has none and takes the uniform fallback
+        if proj_std < FLAT_PROJECTION_STD:
+            valleys = np.empty(0, dtype=np.int32)
+        else:
+            proj_neg = np.negative(proj_sm)  # valleys are peaks of the negated projection
+            coarse_step = max(16, int(round(h / 30)))  # coarse guess ~30 rows visible
+            valleys = _detect_valleys(proj_neg, proj_std, min_distance_px=int(coarse_step * 0.6), prom_ratio=0.30)
+
+        prelim = np.unique(np.clip(np.concatenate(([0], valleys, [h])), 0, h)).astype(np.int32)
+        est_h = _median_interval(prelim)
+        if est_h <= 1:
+            # uniform fallback ~30 laps
+            assumed = 30
+            step = max(1, int(round(h / assumed)))
+            boundaries = np.arange(0, h + 1, step, dtype=np.int32)
+            if boundaries[-1] != h:
+                boundaries = np.append(boundaries, np.int32(h))
+            est_h = step
+        else:
+            boundaries = _merge_close(prelim, min_sep=max(2, int(round(0.35 * est_h))))
 
-    # ---------- pipeline ----------
-    h, w = image.shape[:2]
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    gray = _normalize_contrast(gray)
-    bin_img = _binarize(gray)
-
-    sigma = max(2.0, h / 900.0)  # scale smoothing with height
-    proj_sm = _row_projection(bin_img, sigma=sigma)
-
-    # initial valleys (coarse)
-    coarse_step = max(16, int(round(h / 30)))  # coarse guess ~30 rows visible
-    valleys = _detect_valleys(proj_sm, min_distance_px=int(coarse_step * 0.6), prom_ratio=0.30)
-
-    prelim = np.unique(np.clip(np.concatenate(([0], valleys, [h])), 0, h))
-    est_h = _median_interval(prelim)
-    if est_h <= 1:
-        # uniform fallback ~30 laps
-        assumed = 30
-        step = max(1, int(round(h / assumed)))
-        boundaries = np.arange(0, h + 1, step, dtype=int)
-        if boundaries[-1] != h:
-            boundaries = np.append(boundaries, h)
-        est_h = step
-    else:
-        boundaries = _merge_close(prelim, min_sep=max(2, int(round(0.35 * est_h))))
+        # repair long intervals by inserting missing boundaries
+        boundaries = _repair_long_intervals(boundaries, proj_sm, est_h)
 
-    # repair long intervals by inserting missing boundaries
-    max_len = int(round(1.35 * est_h))
-    changed = True
-    while changed:
-        changed = False
-        i = 0
-        while i < len(boundaries) - 1:
-            y0, y1 = int(boundaries[i]), int(boundaries[i + 1])
-            span = y1 - y0
-            if span > max_len:
-                a = y0 + int(0.20 * est_h)
-                b = y1 - int(0.20 * est_h)
-                if b <= a:
-                    a, b = y0 + span // 3, y1 - span // 3
-                window = proj_sm[max(0, a):min(h, b)]
-                if window.size > 0:
-                    offset = int(np.argmin(window))
-                    split_y = int(np.clip(a + offset, y0 + 4, y1 - 4))
-                else:
-                    split_y = int(y0 + round(est_h))
-                boundaries = np.insert(boundaries, i + 1, split_y)
-                changed = True
-            else:
-                i += 1
+        est_h = _median_interval(boundaries)
 
-    est_h = _median_interval(boundaries)
+        # remove tiny intervals (noise)
+        boundaries = _merge_close(boundaries, max(1, int(round(0.35 * est_h))))
+        return boundaries, est_h
 
-    # remove tiny intervals (noise)
-    min_len = max(1, int(round(0.35 * est_h)))
-    cleaned = [int(boundaries[0])]
-    for b in boundaries[1:]:
-        if b - cleaned[-1] < min_len:
-            cleaned[-1] = int(b)
-        else:
-            cleaned.append(int(b))
-    boundaries = np.array(cleaned, dtype=int)
+    # ---------- pipeline ----------
+    h, w = image.shape[:2]
+    if h < MIN_DETECTION_HEIGHT:
+        boundaries, est_h = _uniform_boundaries(h)
+    else:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        boundaries, est_h = _detect_boundaries(gray)
 
     total_laps = len(boundaries) - 1
     if total_laps <= 0:
-        boundaries = np.linspace(0, h, 6, dtype=int)
+        boundaries = np.linspace(0, h, 6, dtype=np.int32)
         total_laps = 5
         est_h = int(round(h / 30)) if h > 0 else 20
 
@@ -160,37 +311,40 @@ def split_image_into_segments(
     min_top_visible = max(14, int(round(0.12 * est_h))) + max(0, int(extra_top_padding_px))
     min_bottom_visible = max(10, int(round(0.10 * est_h))) + max(0, int(extra_bottom_padding_px))
 
-    segment_images: List[np.ndarray] = []
-    segment_info: List[Dict[str, Any]] = []
+    # ---------- crop windows for all segments at once ----------
+    seg_idx = np.arange(num_segments)
+    start_lap_idxs = seg_idx * laps_per_segment
+    end_lap_idxs = np.minimum(start_lap_idxs + laps_per_segment, total_laps)  # exclusive
 
-    prev_end = -1
-    for seg_idx in range(num_segments):
-        start_lap_idx = seg_idx * laps_per_segment
-        end_lap_idx = min(start_lap_idx + laps_per_segment, total_laps)  # exclusive
+    base_starts = boundaries[start_lap_idxs].astype(np.int64)   # gap before first lap in segment
+    base_ends = boundaries[end_lap_idxs].astype(np.int64)       # gap after last lap in segment
 
-        base_start = int(boundaries[start_lap_idx])   # gap before first lap in segment
-        base_end = int(boundaries[end_lap_idx])       # gap after last lap in segment
+    # Start above the gap for breathing room; end a bit before the next gap to
+    # avoid “lap 6 sliver”
+    y_starts = np.maximum(0, base_starts - pad_up)
+    y_end_floor = np.maximum(y_starts + 1, np.minimum(h, base_ends - pad_end_guard))
 
-        # Start above the gap for breathing room, but don’t overlap previous crop
-        y_start = max(0, base_start - pad_up)
-        if seg_idx > 0 and prev_end >= 0:
-            y_start = max(y_start, prev_end + 2)
+    # Don’t overlap the previous crop: y_start[k] >= y_end[k-1] + 2 and
+    # y_end[k] >= y_start[k] + 1, so y_end[k] = max_j(y_end_floor[j] + 3 * (k - j))
+    y_ends = np.maximum.accumulate(y_end_floor - 3 * seg_idx) + 3 * seg_idx
+    y_starts[1:] = np.maximum(y_starts[1:], y_ends[:-1] + 2)
 
-        # End a bit before the next gap to avoid “lap 6 sliver”
-        y_end = max(y_start + 1, min(h, base_end - pad_end_guard))
+    # --- Hard guarantee: visible padding bands if crop is touching edges ---
+    # If we started at y=0 (or too close), add a black border to keep text away from top edge;
+    # likewise keep a visible bottom margin toward the next gap.
+    add_tops = np.maximum(0, min_top_visible - (base_starts - y_starts))
+    add_bottoms = np.maximum(0, min_bottom_visible - (y_ends - (base_ends - pad_end_guard)))
 
+    segment_images: List[np.ndarray] = []
+    segment_info: List[Dict[str, Any]] = []
+
+    for k, (start_lap_idx, end_lap_idx, y_start, y_end, add_top, add_bottom) in enumerate(zip(
+        start_lap_idxs.tolist(), end_lap_idxs.tolist(), y_starts.tolist(), y_ends.tolist(),
+        add_tops.tolist(), add_bottoms.tolist(),
+    )):
         # Crop
         seg = image[y_start:y_end, :]
 
-        # --- Hard guarantee: visible padding bands if crop is touching edges ---
-        # Visible top margin actually captured in the crop:
-        captured_top_margin = base_start - y_start  # >=0
-        # If we started at y=0 (or too close), add a black border to keep text away from top edge.
-        add_top = max(0, int(min_top_visible - captured_top_margin))
-        # Visible bottom margin toward next gap:
-        captured_bottom_margin = y_end - (base_end - pad_end_guard)
-        add_bottom = max(0, int(min_bottom_visible - captured_bottom_margin))
-
         if add_top > 0 or add_bottom > 0:
             seg = cv2.copyMakeBorder(
                 seg,
@@ -202,7 +356,7 @@ def split_image_into_segments(
         segment_images.append(seg)
 
         segment_info.append({
-            "segment_id": int(seg_idx + 1),
+            "segment_id": int(k + 1),
             "bbox": (0, int(y_start), int(w), int(y_end - y_start)),
             "start_y": int(y_start),
             "end_y": int(y_end),
@@ -220,6 +374,4 @@ def split_image_into_segments(
             "added_bottom_border": int(add_bottom),
         })
 
-        prev_end = y_end
-
     return segment_images, segment_info
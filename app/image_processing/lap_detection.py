@@ -8,6 +8,17 @@ import numpy as np
 from scipy.signal import find_peaks
 
 
+def _compute_row_projection(gray: np.ndarray) -> np.ndarray:
+    """
+    Text-density row projection shared by the lap detectors
+    Sums the adaptive threshold per row in uint32 (255 * width always fits) and widens
+    to the uint64 that np.sum produced, so the negated projection fed to find_peaks
+    is unchanged
+    """
+    thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
+    return thresh.sum(axis=1, dtype=np.uint32).astype(np.uint64)
+
+
 def detect_lap_boundaries(image: np.ndarray) -> Tuple[List[int], float, float]:
     """
     Detect actual lap boundaries in the swimming image
@@ -18,8 +29,7 @@ def detect_lap_boundaries(image: np.ndarray) -> Tuple[List[int], float, float]:
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     
     # Method 1: Text density analysis (most reliable for swimming data)
-    thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
-    vertical_projection = np.sum(thresh, axis=1)
+    vertical_projection = _compute_row_projection(gray)
     
     # Find valleys in the projection (gaps between laps)
     valleys, _ = find_peaks(-vertical_projection, distance=h//30, prominence=np.std(vertical_projection)*0.3)
@@ -105,8 +115,7 @@ def analyze_actual_lap_structure(image: np.ndarray) -> Tuple[int, float]:
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     
     # Method 1: Text density analysis (most reliable for swimming data)
-    thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
-    vertical_projection = np.sum(thresh, axis=1)
+    vertical_projection = _compute_row_projection(gray)
     
     # Find valleys in the projection (gaps between laps)
     valleys, _ = find_peaks(-vertical_projection, distance=h//30, prominence=np.std(vertical_projection)*0.5)
@@ -127,23 +136,19 @@ def analyze_actual_lap_structure(image: np.ndarray) -> Tuple[int, float]:
     lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=50, minLineLength=w//3, maxLineGap=20)
     
     if lines is not None:
-        horizontal_lines = []
-        for line in lines:
-            x1, y1, x2, y2 = line[0]
-            # Check if line is roughly horizontal
-            if abs(y2 - y1) < 15 and abs(x2 - x1) > w//3:
-                horizontal_lines.append((y1 + y2) // 2)
+        x1, y1, x2, y2 = lines[:, 0, :].T
+        # Keep roughly horizontal, wide lines; np.unique gives the sorted distinct mid-heights
+        horizontal = (np.abs(y2 - y1) < 15) & (np.abs(x2 - x1) > w//3)
+        horizontal_lines = np.unique((y1[horizontal] + y2[horizontal]) // 2)
         
-        # Remove duplicate lines
-        horizontal_lines = sorted(set(horizontal_lines))
+        # Remove duplicate lines (each kept line must be >30px below the last kept one)
         filtered_lines = []
-        for y in horizontal_lines:
+        for y in horizontal_lines.tolist():
             if not filtered_lines or abs(y - filtered_lines[-1]) > 30:
                 filtered_lines.append(y)
         
         if len(filtered_lines) >= 5:
-            lap_heights = [filtered_lines[i+1] - filtered_lines[i] for i in range(len(filtered_lines)-1)]
-            avg_lap_height = np.mean(lap_heights)
+            avg_lap_height = np.mean(np.diff(filtered_lines))
             actual_lap_count = len(filtered_lines) + 1
             
             print(f"Detected {len(filtered_lines)} lap separators from edges")
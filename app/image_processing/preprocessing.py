@@ -2,22 +2,40 @@
 Image preprocessing functions for OCR
 """
 
-from typing import Tuple
+import threading
+from typing import Optional, Tuple
 import cv2
 import numpy as np
 
+# CLAHE objects keep internal scratch buffers, so each worker thread gets its own
+_clahe_cache = threading.local()
 
-def preprocess_for_small_text(image: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+
+def get_clahe(clip_limit: float, tile_grid_size: Tuple[int, int] = (8, 8)) -> cv2.CLAHE:
+    """Return a reusable CLAHE instance for the calling thread"""
+    cache = getattr(_clahe_cache, "instances", None)
+    if cache is None:
+        cache = _clahe_cache.instances = {}
+    key = (float(clip_limit), tuple(tile_grid_size))
+    clahe = cache.get(key)
+    if clahe is None:
+        clahe = cache[key] = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid_size)
+    return clahe
+
+
+def preprocess_for_small_text(
+    image: np.ndarray,
+    return_debug: bool = False,
+) -> Tuple[np.ndarray, Optional[np.ndarray]]:
     """
     Aggressive preprocessing for small text on dark background
+    return_debug: also build the BGR debug visualization (None otherwise)
     Returns: (processed_image, debug_image)
     """
-    original = image.copy()
-    
     # Resize to make text larger (3x scaling)
     h, w = image.shape[:2]
-    if h < 2000:
-        scale = 3.0
+    scale = 3.0 if h < 2000 else 1.0
+    if scale != 1.0:
         image = cv2.resize(image, (int(w * scale), int(h * scale)), 
                           interpolation=cv2.INTER_CUBIC)
     
@@ -34,8 +52,7 @@ def preprocess_for_small_text(image: np.ndarray) -> Tuple[np.ndarray, np.ndarray
     denoised = cv2.fastNlMeansDenoising(inv, h=10)
     
     # Enhance contrast
-    clahe = cv2.createCLAHE(clipLimit=4.0, tileGridSize=(8, 8))
-    enhanced = clahe.apply(denoised)
+    enhanced = get_clahe(4.0).apply(denoised)
     
     # Threshold to pure black and white
     _, binary = cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
@@ -44,7 +61,7 @@ def preprocess_for_small_text(image: np.ndarray) -> Tuple[np.ndarray, np.ndarray
     kernel = np.ones((2, 2), np.uint8)
     processed = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
     
-    # Create debug visualization
-    debug = cv2.cvtColor(processed, cv2.COLOR_GRAY2BGR)
+    # Create debug visualization (a full-size BGR copy, so only on request)
+    debug = cv2.cvtColor(processed, cv2.COLOR_GRAY2BGR) if return_debug else None
     
     return processed, debug
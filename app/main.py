@@ -6,6 +6,7 @@ Modular architecture with separated concerns
 import logging
 import sys
 
+import cv2
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
@@ -24,6 +25,14 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 logger.info("🚀 Starting Swim OCR API v2.0.0")
 
+# Image decode is dominated by the JPEG codec; log which one OpenCV was built
+# with so deployments can confirm libjpeg-turbo with SIMD is in use
+codec_info = [
+    " ".join(line.split()) for line in cv2.getBuildInformation().splitlines()
+    if line.strip().startswith(("JPEG:", "SIMD Support:"))
+]
+logger.info(f"🖼️  OpenCV {cv2.__version__} codecs: {'; '.join(codec_info)}")
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Swim OCR API V2",
@@ -0,0 +1,179 @@
+"""
+Tesseract access for the OCR extractors
+
+Uses in-process tesserocr handles (a bounded pool shared by all threads, each with
+its language model loaded once) when tesserocr is installed; otherwise shells out
+through pytesseract as before.
+"""
+
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import pytesseract
+from pytesseract import Output
+
+try:
+    from tesserocr import PyTessBaseAPI, OEM
+    TESSEROCR_AVAILABLE = True
+except ImportError:  # tesserocr is optional; pytesseract is always available
+    TESSEROCR_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Kill a stuck tesseract subprocess instead of holding an OCR worker thread forever;
+# pytesseract raises RuntimeError, which every call site treats as a failed attempt
+TESSERACT_TIMEOUT_SEC = 30
+
+# Most tesserocr handles alive at once (each holds a loaded language model); callers
+# beyond this wait for a handle to be returned
+TESSEROCR_MAX_HANDLES = 8
+
+# Column order of Tesseract's TSV output (what pytesseract's image_to_data parses)
+_TSV_COLUMNS = (
+    "level", "page_num", "block_num", "par_num", "line_num", "word_num",
+    "left", "top", "width", "height", "conf", "text",
+)
+
+# Handles outlive the (often short-lived) threads that borrow them
+_api_slots = threading.BoundedSemaphore(TESSEROCR_MAX_HANDLES)
+_api_lock = threading.Lock()
+_idle_apis: List["PyTessBaseAPI"] = []
+_tesserocr_failed = False
+
+# The handle and last upload of an open ocr_session(), for the thread running it
+_session = threading.local()
+
+
+def _new_api() -> Optional["PyTessBaseAPI"]:
+    """A fresh handle, or None (remembered) if tesserocr cannot load a language model"""
+    global _tesserocr_failed
+    try:
+        return PyTessBaseAPI(oem=OEM.DEFAULT)  # same as --oem 3
+    except RuntimeError as e:  # e.g. no traineddata on tesserocr's tessdata path
+        logger.warning(f"tesserocr unavailable, falling back to pytesseract: {e}")
+        _tesserocr_failed = True
+        return None
+
+
+@contextmanager
+def _borrow_api() -> Iterator[Optional["PyTessBaseAPI"]]:
+    """
+    Lend out an idle tesserocr handle, creating one while fewer than
+    TESSEROCR_MAX_HANDLES exist; yields None when pytesseract must be used
+    """
+    if not TESSEROCR_AVAILABLE or _tesserocr_failed:
+        yield None
+        return
+    with _api_slots:
+        with _api_lock:
+            api = _idle_apis.pop() if _idle_apis else None
+        if api is None:
+            api = _new_api()
+            if api is None:
+                yield None
+                return
+        try:
+            yield api
+        finally:
+            api.Clear()  # drop the image and results; the language model stays loaded
+            with _api_lock:
+                _idle_apis.append(api)
+
+
+@contextmanager
+def ocr_session() -> Iterator[None]:
+    """
+    Run a block of OCR calls on this thread with one tesserocr handle, so a PSM sweep
+    over the same array uploads its pixels once; the held image, its pixel copy and
+    the handle are all released when the block exits
+    """
+    if getattr(_session, "api", None) is not None:  # nested: the outer session serves
+        yield
+        return
+    with _borrow_api() as api:
+        _session.api = api
+        _session.image = _session.pixels = None
+        try:
+            yield
+        finally:
+            _session.api = _session.image = _session.pixels = None
+
+
+def _set_session_image(api: "PyTessBaseAPI", image: np.ndarray, psm: int) -> None:
+    """_set_image for the session's handle, reusing the upload when image is the last one set"""
+    if _session.image is image:
+        # resetting the full-image rectangle drops the last page's layout and text,
+        # so the next recognition reruns with the new PSM on the same pixels
+        height, width = image.shape[:2]
+        api.SetPageSegMode(psm)
+        api.SetRectangle(0, 0, width, height)
+        return
+    _session.pixels = _set_image(api, image, psm)
+    _session.image = image
+
+
+def _set_image(api: "PyTessBaseAPI", image: np.ndarray, psm: int) -> bytes:
+    """
+    Load image into api; returns the pixel buffer, which the caller must keep alive
+    until recognition is done (SetImageBytes does not copy it)
+    """
+    # raw bytes, channels as stored - the same pixels pytesseract hands to tesseract
+    image = np.ascontiguousarray(image)
+    height, width = image.shape[:2]
+    channels = 1 if image.ndim == 2 else image.shape[2]
+    pixels = image.tobytes()
+    api.SetPageSegMode(psm)
+    api.SetImageBytes(pixels, width, height, channels, width * channels)
+    return pixels
+
+
+def _tsv_to_dict(tsv: str) -> Dict[str, List[Any]]:
+    data: Dict[str, List[Any]] = {col: [] for col in _TSV_COLUMNS}
+    for row in tsv.splitlines():
+        fields = row.split("\t", len(_TSV_COLUMNS) - 1)
+        if len(fields) < len(_TSV_COLUMNS) - 1:
+            continue
+        if len(fields) == len(_TSV_COLUMNS) - 1:
+            fields.append("")
+        for col, value in zip(_TSV_COLUMNS[:-2], fields):
+            data[col].append(int(value))
+        data["conf"].append(float(fields[-2]))
+        data["text"].append(fields[-1])
+    return data
+
+
+def image_to_data(image: np.ndarray, psm: int) -> Dict[str, List[Any]]:
+    """Word boxes in pytesseract's Output.DICT layout"""
+    api = getattr(_session, "api", None)
+    if api is not None:
+        _set_session_image(api, image, psm)
+        api.Recognize()
+        return _tsv_to_dict(api.GetTSVText(0))
+    with _borrow_api() as api:
+        if api is not None:
+            pixels = _set_image(api, image, psm)
+            api.Recognize()
+            tsv = api.GetTSVText(0)
+            del pixels
+            return _tsv_to_dict(tsv)
+    return pytesseract.image_to_data(
+        image, output_type=Output.DICT, config=f'--psm {psm} --oem 3', timeout=TESSERACT_TIMEOUT_SEC
+    )
+
+
+def image_to_string(image: np.ndarray, psm: int) -> str:
+    """Plain recognized text"""
+    api = getattr(_session, "api", None)
+    if api is not None:
+        _set_session_image(api, image, psm)
+        return api.GetUTF8Text()
+    with _borrow_api() as api:
+        if api is not None:
+            pixels = _set_image(api, image, psm)
+            text = api.GetUTF8Text()
+            del pixels
+            return text
+    return pytesseract.image_to_string(image, config=f'--psm {psm} --oem 3', timeout=TESSERACT_TIMEOUT_SEC)
@@ -4,16 +4,20 @@ Text extraction and parsing functions for swimming data (fixed)
 
 from __future__ import annotations
 
+import os
 import re
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import List, Dict, Any, Tuple, Optional
 
 import cv2
 import numpy as np
-import pytesseract
-from pytesseract import Output
 
+from ..helpers.jit import njit, NUMBA_AVAILABLE
 from ..helpers.utils import seconds_to_mmss
+from ..image_processing.preprocessing import get_clahe
+from .tesseract_engine import image_to_data, image_to_string, ocr_session
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -24,6 +28,14 @@ logger.setLevel(logging.DEBUG)
 # Shared helpers & patterns
 # =========================
 
+# Concurrent tesseract attempts for the multi-attempt extractor
+OCR_MAX_WORKERS = min(8, os.cpu_count() or 1)
+
+# Region extraction is only tried when the binarized image shows at least this many
+# text rows (runs of >= TEXT_ROW_MIN_HEIGHT rows whose black pixels cover >= 10% of the width)
+REGION_MIN_TEXT_ROWS = 5
+TEXT_ROW_MIN_HEIGHT = 14
+
 STROKE_CANON = {
     "breaststroke": "Breaststroke",
     "freestyle": "Freestyle",
@@ -45,23 +57,54 @@ STROKE_ALIASES: Dict[str, str] = {
     r"\bfl\b": "Butterfly",
 }
 
-PACE_PATTERNS = [
+# All aliases in one alternation; group i + 1 is alias i, so a lower lastindex
+# means a higher-priority alias (dict order)
+_STROKE_ALIAS_RE = re.compile("|".join(f"({pat})" for pat in STROKE_ALIASES))
+_STROKE_ALIAS_CANON = list(STROKE_ALIASES.values())
+
+PACE_PATTERNS = (
     re.compile(r"(\d+)[\'′](\d+)[\"″]"),
     re.compile(r"(\d+):(\d{2})"),
     re.compile(r"(\d+)\s*min\s*(\d{1,2})\s*sec", re.IGNORECASE),
-]
+)
 
-TIME_PATTERNS = [
+TIME_PATTERNS = (
     re.compile(r"(\d{1,2}):(\d{2}):(\d{2})"),
     re.compile(r"(\d{1,2}):(\d{2})"),
     re.compile(r"(\d+)[\'′](\d{2})[\"″]"),
-]
+)
+
+# Compiled once; these run for every OCR line/context across all variant x PSM attempts
+_STROKES_RE = re.compile(r"\bStrokes?\b", re.IGNORECASE)
+_SWOLF_RE = re.compile(r"\bSWOLF\b", re.IGNORECASE)
+_STROKES_THEN_SWOLF_RE = re.compile(r"Strokes?.*?SWOLF", re.IGNORECASE | re.DOTALL)
+_LAP_NUMBER_RE = re.compile(r"\b(\d{1,3})\b")
+_LEADING_LAP_NUMBER_RE = re.compile(r"^\s*(\d{1,3})\b")
+# A header line is a 1-3 digit lap number followed (anywhere later on the line) by a stroke token
+_HEADER_TOKENS = ("breast", "free", "back", "butter", "fly", "br", "fr", "bk", "ba", "bf", "fl")
+_HEADER_LINE_RE = re.compile(r"\b(\d{1,3})\b.*?(" + "|".join(_HEADER_TOKENS) + ")", re.IGNORECASE)
+_LAP_LENGTH_RE = re.compile(r"(?<!/)\b(25|50|75|100|150|200)\s*m(?:eters?|etres?)?\b", re.IGNORECASE)
+_PER_100M_RE = re.compile(r"/\s*100\s*m", re.IGNORECASE)
+_INT_TOKEN_RE = re.compile(r"\b\d{1,3}\b")
+
+
+def _has_metric_labels(text: str) -> bool:
+    """True if text contains both the Strokes and SWOLF labels (as whole words)"""
+    # Cheap substring reject before the regexes. casefold rather than lower: every
+    # character the IGNORECASE patterns accept (e.g. 'ſ' for 's') folds to the ASCII letter
+    folded = text.casefold()
+    if "stroke" not in folded or "swolf" not in folded:
+        return False
+    return bool(_STROKES_RE.search(text) and _SWOLF_RE.search(text))
 
 
 def _to_seconds(m: int, s: int) -> int:
     return int(m) * 60 + int(s)
 
 
+# The fallback chain asks for pace/time of the same segment text several times;
+# results are plain ints, so memoizing is safe
+@lru_cache(maxsize=256)
 def _extract_pace_seconds(text: str) -> int:
     for pat in PACE_PATTERNS:
         m = pat.search(text)
@@ -70,6 +113,7 @@ def _extract_pace_seconds(text: str) -> int:
     return 120
 
 
+@lru_cache(maxsize=256)
 def _extract_time_seconds(text: str) -> int:
     for pat in TIME_PATTERNS:
         m = pat.search(text)
@@ -85,9 +129,16 @@ def _extract_time_seconds(text: str) -> int:
 
 def _detect_stroke(text: str) -> Optional[str]:
     low = text.lower()
-    for pat, canon in STROKE_ALIASES.items():
-        if re.search(pat, low):
-            return canon
+    # one scan instead of one search per alias; aliases are single \b-delimited words,
+    # so matches never hide a higher-priority alias and the best lastindex wins
+    best = None
+    for m in _STROKE_ALIAS_RE.finditer(low):
+        if best is None or m.lastindex < best:
+            best = m.lastindex
+            if best == 1:
+                break
+    if best is not None:
+        return _STROKE_ALIAS_CANON[best - 1]
     for k, v in STROKE_CANON.items():
         if k in low:
             return v
@@ -95,13 +146,12 @@ def _detect_stroke(text: str) -> Optional[str]:
 
 
 def _extract_length_from_header(header_text: str, default: int = 50) -> int:
-    m = re.search(r"(?<!/)\b(25|50|75|100|150|200)\s*m(?:eters?|etres?)?\b",
-                  header_text, re.IGNORECASE)
+    m = _LAP_LENGTH_RE.search(header_text)
     if m:
         val = int(m.group(1))
         if val in (25, 50):
             return val
-        if val == 100 and re.search(r"/\s*100\s*m", header_text, re.IGNORECASE):
+        if val == 100 and _PER_100M_RE.search(header_text):
             return 50
         return val
     return default
@@ -133,32 +183,40 @@ def _extract_metrics_by_labels_anywhere(text: str) -> Optional[Tuple[int, int, i
     return strokes, swolf, pace_sec
 
 
+_VALUES_LABEL_LINE_RE = re.compile(r"^[^\n]*?\bStrokes?\b[^\n]*\bSWOLF\b", re.IGNORECASE | re.MULTILINE)
+
+
 def _extract_from_values_row(lines: List[str]) -> Optional[Tuple[int, int, int]]:
-    label_re = re.compile(r"\bStrokes?\b.*\bSWOLF\b", re.IGNORECASE)
-    for i, ln in enumerate(lines):
-        if label_re.search(ln):
-            for j in range(i + 1, min(i + 3, len(lines))):
-                row = re.sub(r"/\s*100\s*m", "", lines[j], flags=re.IGNORECASE)
-                ints = [int(x) for x in re.findall(r"\b\d{1,3}\b", row)]
-                if len(ints) >= 2:
-                    strokes, swolf = ints[0], ints[1]
-                    if _numbers_plausible(strokes, swolf):
-                        pace_sec = _extract_pace_seconds(row)
-                        if pace_sec == 120:
-                            pace_sec = _extract_pace_seconds(" ".join(lines))
-                        return strokes, swolf, pace_sec
+    # find label lines with one scan over the joined text instead of a search per line
+    joined = "\n".join(lines)
+    i, pos = 0, 0
+    for m in _VALUES_LABEL_LINE_RE.finditer(joined):
+        i += joined.count("\n", pos, m.start())
+        pos = m.start()
+        for j in range(i + 1, min(i + 3, len(lines))):
+            row = _PER_100M_RE.sub("", lines[j])
+            ints = [int(x) for x in _INT_TOKEN_RE.findall(row)]
+            if len(ints) >= 2:
+                strokes, swolf = ints[0], ints[1]
+                if _numbers_plausible(strokes, swolf):
+                    pace_sec = _extract_pace_seconds(row)
+                    if pace_sec == 120:
+                        pace_sec = _extract_pace_seconds(" ".join(lines))
+                    return strokes, swolf, pace_sec
     return None
 
 
 def _rescue_numbers_from_blob(text: str) -> Optional[Tuple[int, int]]:
-    after = re.search(r"Strokes?.*?SWOLF", text, re.IGNORECASE | re.DOTALL)
+    after = _STROKES_THEN_SWOLF_RE.search(text)
     zone = text[after.end():] if after else text
-    zone = re.sub(r"/\s*100\s*m", "", zone, flags=re.IGNORECASE)
-    ints = [int(x) for x in re.findall(r"\b\d{1,3}\b", zone)]
-    for k in range(len(ints) - 1):
-        s, w = ints[k], ints[k + 1]
-        if _numbers_plausible(s, w):
-            return s, w
+    zone = _PER_100M_RE.sub("", zone)
+    # stream the numbers and stop at the first plausible adjacent pair
+    prev = None
+    for m in _INT_TOKEN_RE.finditer(zone):
+        cur = int(m.group())
+        if prev is not None and _numbers_plausible(prev, cur):
+            return prev, cur
+        prev = cur
     return None
 
 
@@ -177,8 +235,14 @@ def _extract_strokes_swolf_pace(text: str, lines: Optional[List[str]] = None) ->
     if pair:
         return pair[0], pair[1], pace_sec
 
-    ints = [int(x) for x in re.findall(r"\b\d{1,3}\b", re.sub(r"/\s*100\s*m", "", text, flags=re.IGNORECASE))]
-    plausible = [n for n in ints if 5 <= n <= 300]
+    # only the first two values in 5..300 are needed; stop scanning once found
+    plausible: List[int] = []
+    for m in _INT_TOKEN_RE.finditer(_PER_100M_RE.sub("", text)):
+        n = int(m.group())
+        if 5 <= n <= 300:
+            plausible.append(n)
+            if len(plausible) == 2:
+                break
     if len(plausible) >= 2:
         strokes, swolf = plausible[0], plausible[1]
         if not _numbers_plausible(strokes, swolf):
@@ -192,6 +256,10 @@ def _extract_strokes_swolf_pace(text: str, lines: Optional[List[str]] = None) ->
 
 
 def _postprocess_and_sort(segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Order segments (by position when known, else by lap) and renumber laps unless
+    already strictly increasing; idempotent, so parser output needs no second pass
+    """
     if not segments:
         return segments
     if any("y_top" in s for s in segments):
@@ -214,12 +282,20 @@ def parse_segment_text(text: str, expected_lap: int) -> Optional[Dict[str, Any]]
     if not text or not text.strip():
         return None
 
-    lines = [l.strip() for l in text.splitlines() if l.strip()]
+    # the parse only sees the stripped, non-empty lines, so key the cache on those;
+    # OCR variants of the same segment often produce the same lines
+    seg = _parse_segment_lines("\n".join(l.strip() for l in text.splitlines() if l.strip()), expected_lap)
+    return dict(seg) if seg else None
+
+
+@lru_cache(maxsize=4096)
+def _parse_segment_lines(joined: str, expected_lap: int) -> Optional[Dict[str, Any]]:
+    """parse_segment_text on canonical input; cached, so callers must copy the result"""
+    lines = joined.split("\n")
     blob = " ".join(lines)
 
     # need at least Strokes & SWOLF in the blob
-    if not (re.search(r"\bStrokes?\b", blob, re.IGNORECASE) and
-            re.search(r"\bSWOLF\b", blob, re.IGNORECASE)):
+    if not _has_metric_labels(blob):
         return None
 
     header_line = None
@@ -231,21 +307,13 @@ def parse_segment_text(text: str, expected_lap: int) -> Optional[Dict[str, Any]]
         header_line = lines[0]
 
     stroke = _detect_stroke(header_line) or "Freestyle"
-    lap_m = re.search(r"\b(\d{1,3})\b", header_line)
+    lap_m = _LAP_NUMBER_RE.search(header_line)
     lap_num = int(lap_m.group(1)) if lap_m else expected_lap
     lap_length = _extract_length_from_header(header_line, default=50)
 
-    trio = _extract_metrics_by_labels_anywhere(blob)
-    if not trio:
-        trio = _extract_from_values_row(lines)
-    if not trio:
-        trio = _extract_strokes_swolf_pace(blob, lines)
-    strokes, swolf, pace_per_100m_sec = trio
-
-    if not _numbers_plausible(strokes, swolf):
-        pair = _rescue_numbers_from_blob(blob)
-        if pair and _numbers_plausible(pair[0], pair[1]):
-            strokes, swolf = pair
+    # one pass through the fallback chain: labels anywhere -> values row -> blob rescue;
+    # an implausible result here means the rescue already came up empty on this blob
+    strokes, swolf, pace_per_100m_sec = _extract_strokes_swolf_pace(blob, lines)
 
     duration_sec = _extract_time_seconds(blob)
     if lap_length == 100:
@@ -263,96 +331,77 @@ def parse_segment_text(text: str, expected_lap: int) -> Optional[Dict[str, Any]]
 
 
 def _is_header_line(txt: str) -> bool:
-    return bool(re.search(
-        r"\b(\d{1,3})\b.*?(breast|free|back|butter|fly|br|fr|bk|ba|bf|fl)",
-        txt, re.IGNORECASE
-    ))
+    if not txt.isascii() or "\n" in txt:
+        # IGNORECASE matching of non-ASCII letters is not plain lowercasing
+        return bool(_HEADER_LINE_RE.search(txt))
+    # the first lap number leaves the longest tail; a token anywhere in it matches
+    m = _LAP_NUMBER_RE.search(txt)
+    if not m:
+        return False
+    tail = txt[m.end():].lower()
+    return any(tok in tail for tok in _HEADER_TOKENS)
 
 
 def parse_ocr_data_structured(data: dict) -> List[Dict[str, Any]]:
-    # collect word boxes
-    text_blocks = []
-    for i, t in enumerate(data.get("text", [])):
-        t = (t or "").strip()
-        if not t:
-            continue
-        try:
-            conf_val = float(str(data["conf"][i]))
-        except Exception:
-            conf_val = -1.0
-        text_blocks.append({
-            "text": t,
-            "x": int(data["left"][i]),
-            "y": int(data["top"][i]),
-            "w": int(data["width"][i]),
-            "h": int(data["height"][i]),
-            "conf": conf_val,
-        })
-
-    # sort and group into lines
-    text_blocks.sort(key=lambda b: (b["y"], b["x"]))
-
-    lines = []
-    current = []
-    last_y = None
-
-    def flush():
-        if not current:
-            return
-        ys = [x["y"] for x in current]
-        xs = [x["x"] for x in current]
-        lines.append({
-            "y_top": min(ys),
-            "x_left": min(xs),
-            "text": " ".join(x["text"] for x in sorted(current, key=lambda z: z["x"]))
-        })
-
-    for b in text_blocks:
-        thresh = max(12, int(0.6 * b["h"]))
-        if last_y is None or abs(b["y"] - last_y) <= thresh:
-            current.append(b)
-            last_y = b["y"] if last_y is None else (last_y + b["y"]) // 2
-        else:
-            flush()
-            current = [b]
-            last_y = b["y"]
-    flush()
+    # collect word boxes as parallel arrays (non-empty words only)
+    texts = [(t or "").strip() for t in data.get("text", [])]
+    keep = np.flatnonzero(np.fromiter(map(bool, texts), dtype=bool, count=len(texts)))
+
+    # OCR lines as parallel lists: text, top y and left x
+    line_texts: List[str] = []
+    line_tops: List[int] = []
+    line_lefts: List[int] = []
+    if keep.size:
+        xs = np.asarray(data["left"])[keep].astype(np.int64)
+        ys = np.asarray(data["top"])[keep].astype(np.int64)
+        hs = np.asarray(data["height"])[keep].astype(np.int64)
+
+        # sort by (y, x); lexsort is stable like the sort it replaces
+        order = np.lexsort((xs, ys))
+        words = [texts[i] for i in keep[order].tolist()]
+        xs, ys, hs = xs[order], ys[order], hs[order]
+
+        # group into lines: a word joins the current line if it is within
+        # max(12, 0.6 * its height) of the line's running-average y
+        thresh = np.maximum(12, (0.6 * hs).astype(np.int64))
+        line_ids = np.empty(len(words), dtype=np.int64)
+        line = 0
+        last_y = None
+        for k, (y, t) in enumerate(zip(ys.tolist(), thresh.tolist())):
+            if last_y is None or abs(y - last_y) <= t:
+                last_y = y if last_y is None else (last_y + y) // 2
+            else:
+                line += 1
+                last_y = y
+            line_ids[k] = line
+
+        # words arrive in y order, so a line's first word has its y_top; one stable
+        # sort by (line, x) then puts every line in reading order, x_left first
+        by_x = np.lexsort((xs, line_ids))
+        words = [words[k] for k in by_x.tolist()]
+        starts = np.r_[0, np.flatnonzero(np.diff(line_ids)) + 1]
+        ends = np.r_[starts[1:], len(words)]
+        line_texts = [" ".join(words[s0:s1]) for s0, s1 in zip(starts.tolist(), ends.tolist())]
+        line_tops = ys[starts].tolist()
+        line_lefts = xs[by_x][starts].tolist()
 
     # ---- FIX: build context from this header up to the next header (no hard cap) ----
     segments: List[Dict[str, Any]] = []
-    i = 0
-    while i < len(lines):
-        row = lines[i]["text"]
-
-        if not _is_header_line(row):
-            i += 1
-            continue
-
-        # find the next header index
-        j = i + 1
-        while j < len(lines) and not _is_header_line(lines[j]["text"]):
-            j += 1
+    # test each line once; every header owns the lines up to the next header
+    header_idxs = [k for k, txt in enumerate(line_texts) if _is_header_line(txt)]
+    for i, j in zip(header_idxs, header_idxs[1:] + [len(line_texts)]):
+        row = line_texts[i]
 
         # take ALL lines from this header until (but not including) the next header
-        ctx_lines = [lines[k]["text"] for k in range(i, j)]
-        ctx_blob = "  ".join(ctx_lines)
-
-        if not (re.search(r"\bStrokes?\b", ctx_blob, re.IGNORECASE) and
-                re.search(r"\bSWOLF\b", ctx_blob, re.IGNORECASE)):
-            # if labels are noisy, try still to parse (fallback uses rescue logic)
-            seg = parse_segment_text("\n".join(ctx_lines), expected_lap=1)
-        else:
-            seg = parse_segment_text("\n".join(ctx_lines), expected_lap=1)
+        # parse_segment_text falls back to rescue logic when the labels are noisy
+        seg = parse_segment_text("\n".join(line_texts[i:j]), expected_lap=1)
 
         if seg:
             seg["lap_length_m"] = _extract_length_from_header(row, default=50)
-            seg["y_top"] = lines[i]["y_top"]
-            seg["x_left"] = lines[i]["x_left"]
+            seg["y_top"] = line_tops[i]
+            seg["x_left"] = line_lefts[i]
             segments.append(seg)
 
-        # move to the next header found (j), or advance one if none
-        i = j if j > i else i + 1
-
     segments = _postprocess_and_sort(segments)
 
     for s in segments:
@@ -364,6 +413,25 @@ def parse_ocr_data_structured(data: dict) -> List[Dict[str, Any]]:
     return segments
 
 
+def _label_window_starts(lines: List[str], before: int, after: int) -> List[int]:
+    """
+    Indices i whose context window lines[i - before:i + after] mentions both the
+    Strokes and SWOLF labels (substring test, the same gate _has_metric_labels starts with)
+    Labels never span lines, so per-line flags and prefix counts replace a join per window
+    """
+    n_stroke, n_swolf = [0], [0]
+    for line in lines:
+        folded = line.casefold()
+        n_stroke.append(n_stroke[-1] + ("stroke" in folded))
+        n_swolf.append(n_swolf[-1] + ("swolf" in folded))
+    starts = []
+    for i in range(len(lines)):
+        lo, hi = max(0, i - before), min(len(lines), i + after)
+        if n_stroke[hi] > n_stroke[lo] and n_swolf[hi] > n_swolf[lo]:
+            starts.append(i)
+    return starts
+
+
 def parse_text_simple(text: str) -> List[Dict[str, Any]]:
     segments: List[Dict[str, Any]] = []
     if not text:
@@ -371,17 +439,14 @@ def parse_text_simple(text: str) -> List[Dict[str, Any]]:
 
     lines = [l for l in text.splitlines() if l.strip()]
     expected = 1
-    for i, line in enumerate(lines):
-        ctx = [line]
-        if i + 1 < len(lines): ctx.append(lines[i + 1])
-        if i + 2 < len(lines): ctx.append(lines[i + 2])
-        blob = "  ".join(ctx)
-
-        if not (re.search(r"\bStrokes?\b", blob, re.IGNORECASE) and
-                re.search(r"\bSWOLF\b", blob, re.IGNORECASE)):
+    for i in _label_window_starts(lines, 0, 3):
+        line = lines[i]
+        blob = "  ".join(lines[i:i + 3])
+
+        if not _has_metric_labels(blob):
             continue
 
-        lap_m = re.search(r"^\s*(\d{1,3})\b", line.strip())
+        lap_m = _LEADING_LAP_NUMBER_RE.search(line.strip())
         lap_num = int(lap_m.group(1)) if lap_m else expected
 
         seg = parse_segment_text(blob, lap_num)
@@ -393,9 +458,115 @@ def parse_text_simple(text: str) -> List[Dict[str, Any]]:
 
 
 # =========================
-# Region-based extraction (unchanged)
+# Region-based extraction
 # =========================
 
+@lru_cache(maxsize=16)
+def _horizontal_kernel(width: int) -> np.ndarray:
+    """width x 1 rectangular structuring element (read-only, shared between calls)"""
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (width, 1))
+    kernel.setflags(write=False)
+    return kernel
+
+
+def _boxes_intersect(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise strict-overlap matrix between (N, 4) and (M, 4) arrays of x, y, w, h boxes"""
+    ax, ay, aw, ah = (a[:, i, None] for i in range(4))
+    bx, by, bw, bh = (b[None, :, i] for i in range(4))
+    return (ax < bx + bw) & (ax + aw > bx) & (ay < by + bh) & (ay + ah > by)
+
+
+def _add_non_overlapping(boxes: List[Tuple[int, int, int, int]], candidates: np.ndarray) -> None:
+    """
+    Append candidates (in order) that overlap neither an existing box nor a
+    candidate accepted before them - the greedy scan, with the overlap tests vectorized.
+    """
+    if len(candidates) == 0:
+        return
+    candidates = np.asarray(candidates, dtype=np.int64).reshape(-1, 4)
+    blocked = np.zeros(len(candidates), dtype=bool)
+    if boxes:
+        blocked |= _boxes_intersect(candidates, np.asarray(boxes, dtype=np.int64)).any(axis=1)
+    pairwise = _boxes_intersect(candidates, candidates)
+    for k in range(len(candidates)):
+        if not blocked[k]:
+            boxes.append(tuple(candidates[k].tolist()))
+            blocked |= pairwise[k]
+
+
+@njit(cache=True, nogil=True)
+def _dedupe_boxes_jit(arr: np.ndarray) -> np.ndarray:
+    """Compiled scalar version of the greedy pass in _dedupe_boxes; returns kept row indices"""
+    n = arr.shape[0]
+    kept = np.empty(n, dtype=np.int64)
+    m = 0
+    for k in range(n):
+        x1 = arr[k, 0]
+        y1 = arr[k, 1]
+        x2 = x1 + arr[k, 2]
+        y2 = y1 + arr[k, 3]
+        area = arr[k, 2] * arr[k, 3]
+        dup = False
+        for t in range(m):
+            j = kept[t]
+            overlap_w = min(x2, arr[j, 0] + arr[j, 2]) - max(x1, arr[j, 0])
+            overlap_h = min(y2, arr[j, 1] + arr[j, 3]) - max(y1, arr[j, 1])
+            if overlap_w <= 0 or overlap_h <= 0:
+                continue
+            min_area = min(area, arr[j, 2] * arr[j, 3])
+            if min_area > 0 and overlap_w * overlap_h > 0.3 * min_area:
+                dup = True
+                break
+        if not dup:
+            kept[m] = k
+            m += 1
+    return kept[:m].copy()
+
+
+def _dedupe_boxes(boxes: List[Tuple[int, int, int, int]]) -> List[Tuple[int, int, int, int]]:
+    """
+    Visit boxes top-to-bottom (then left-to-right) and drop any whose overlap with
+    an already kept box exceeds 30% of the smaller box's area.
+    Uses the compiled scalar loop instead of the pairwise matrices when numba is installed.
+    """
+    if not boxes:
+        return []
+    arr = np.asarray(boxes, dtype=np.int64)
+    arr = arr[np.lexsort((arr[:, 0], arr[:, 1]))]  # stable, like sorted(key=(y, x))
+    if NUMBA_AVAILABLE:
+        return [tuple(row) for row in arr[_dedupe_boxes_jit(arr)].tolist()]
+
+    x1, y1 = arr[:, 0], arr[:, 1]
+    x2, y2 = x1 + arr[:, 2], y1 + arr[:, 3]
+    overlap_w = np.maximum(0, np.minimum.outer(x2, x2) - np.maximum.outer(x1, x1))
+    overlap_h = np.maximum(0, np.minimum.outer(y2, y2) - np.maximum.outer(y1, y1))
+    areas = arr[:, 2] * arr[:, 3]
+    min_area = np.minimum.outer(areas, areas)
+    dup = (min_area > 0) & (overlap_w * overlap_h > 0.3 * min_area)
+
+    kept: List[Tuple[int, int, int, int]] = []
+    blocked = np.zeros(len(arr), dtype=bool)
+    for k in range(len(arr)):
+        if not blocked[k]:
+            kept.append(tuple(arr[k].tolist()))
+            blocked |= dup[k]
+    return kept
+
+
+if NUMBA_AVAILABLE:
+    # compile (or load from the on-disk cache) at import instead of on the first request
+    _dedupe_boxes_jit(np.array([[0, 0, 10, 10], [5, 5, 10, 10]], dtype=np.int64))
+
+
+def _count_text_rows(binary: np.ndarray, min_height: int = TEXT_ROW_MIN_HEIGHT) -> int:
+    """Number of horizontal bands of dark (text) pixels at least min_height rows tall"""
+    row_black = (binary == 0).sum(axis=1)
+    is_text = np.concatenate(([False], row_black > 0.1 * binary.shape[1], [False]))
+    edges = np.flatnonzero(np.diff(is_text.astype(np.int8)))
+    run_lengths = edges[1::2] - edges[::2]
+    return int((run_lengths >= min_height).sum())
+
+
 def extract_by_regions(image: np.ndarray, debug_img: np.ndarray) -> Tuple[List[Dict[str, Any]], np.ndarray]:
     from ..image_processing.preprocessing import preprocess_for_small_text
 
@@ -404,78 +575,41 @@ def extract_by_regions(image: np.ndarray, debug_img: np.ndarray) -> Tuple[List[D
 
     boxes: List[Tuple[int, int, int, int]] = []
 
-    horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(10, w // 20), 1))
-    detect_horizontal = cv2.morphologyEx(processed, cv2.MORPH_OPEN, horizontal_kernel)
+    # text rows: a horizontal opening of the white background grows the black text
+    # into line-wide blobs; their outlines are the row boxes
+    detect_horizontal = cv2.morphologyEx(processed, cv2.MORPH_OPEN, _horizontal_kernel(max(10, w // 20)))
     cnts, _ = cv2.findContours(cv2.bitwise_not(detect_horizontal), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    for c in cnts:
-        x, y, ww, hh = cv2.boundingRect(c)
-        if hh > 20 and ww > 80:
-            boxes.append((x, y, ww, hh))
-
-    num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(processed, connectivity=8)
-    for i in range(1, num_labels):
-        x, y, ww, hh, area = stats[i]
-        if hh > 18 and ww > 60 and area > 450:
-            overlaps = False
-            for ex, ey, ew, eh in boxes:
-                if (x < ex + ew and x + ww > ex and y < ey + eh and y + hh > ey):
-                    overlaps = True
-                    break
-            if not overlaps:
-                boxes.append((x, y, ww, hh))
+    rects = np.array([cv2.boundingRect(c) for c in cnts], dtype=np.int64).reshape(-1, 4)
+    boxes.extend(map(tuple, rects[(rects[:, 3] > 20) & (rects[:, 2] > 80)].tolist()))
+
+    _, _, stats, _ = cv2.connectedComponentsWithStats(processed, connectivity=8)
+    comp = stats[1:]
+    keep = (comp[:, cv2.CC_STAT_HEIGHT] > 18) & (comp[:, cv2.CC_STAT_WIDTH] > 60) & (comp[:, cv2.CC_STAT_AREA] > 450)
+    _add_non_overlapping(boxes, comp[keep, :4])
 
     strip_n = min(40, max(20, h // 40))
     strip_height = max(12, h // strip_n)
-    for i in range(strip_n):
-        y0 = i * strip_height
-        y1 = min(h, (i + 1) * strip_height)
-        strip = processed[y0:y1, :]
-        text_pixels = int((strip == 0).sum())
-        if text_pixels > max(80, (y1 - y0) * w * 0.01):
-            cnts, _ = cv2.findContours(strip, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            for c in cnts:
-                x, y_rel, ww, hh = cv2.boundingRect(c)
-                y_abs = y0 + y_rel
-                if hh > 14 and ww > 50:
-                    overlaps = False
-                    for ex, ey, ew, eh in boxes:
-                        if (x < ex + ew and x + ww > ex and y_abs < ey + eh and y_abs + hh > ey):
-                            overlaps = True
-                            break
-                    if not overlaps:
-                        boxes.append((x, y_abs, ww, hh))
+    # text pixels of every strip from one pass over the image (prefix sums of row counts)
+    row_cum = np.concatenate(([0], np.cumsum(np.count_nonzero(processed == 0, axis=1))))
+    strip_y0 = np.minimum(np.arange(strip_n) * strip_height, h)
+    strip_y1 = np.minimum(strip_y0 + strip_height, h)
+    text_pixels = row_cum[strip_y1] - row_cum[strip_y0]
+    dense = np.flatnonzero(text_pixels > np.maximum(80, (strip_y1 - strip_y0) * w * 0.01))
+    for y0, y1 in zip(strip_y0[dense].tolist(), strip_y1[dense].tolist()):
+        cnts, _ = cv2.findContours(processed[y0:y1, :], cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        rects = np.array([cv2.boundingRect(c) for c in cnts], dtype=np.int64).reshape(-1, 4)
+        rects[:, 1] += y0
+        _add_non_overlapping(boxes, rects[(rects[:, 3] > 14) & (rects[:, 2] > 50)])
 
     bottom_start = int(h * 0.8)
     bottom_region = processed[bottom_start:, :]
     cnts, _ = cv2.findContours(bottom_region, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    for c in cnts:
-        x, y_rel, ww, hh = cv2.boundingRect(c)
-        y_abs = bottom_start + y_rel
-        if hh > 10 and ww > 40:
-            overlaps = False
-            for ex, ey, ew, eh in boxes:
-                if (x < ex + ew and x + ww > ex and y_abs < ey + eh and y_abs + hh > ey):
-                    overlaps = True
-                    break
-            if not overlaps:
-                boxes.append((x, y_abs, ww, hh))
-
-    # dedupe
-    filtered: List[Tuple[int, int, int, int]] = []
-    for x, y, ww, hh in sorted(boxes, key=lambda b: (b[1], b[0])):
-        is_dup = False
-        for ex, ey, ew, eh in filtered:
-            overlap_w = max(0, min(x + ww, ex + ew) - max(x, ex))
-            overlap_h = max(0, min(y + hh, ey + eh) - max(y, ey))
-            overlap_area = overlap_w * overlap_h
-            min_area = min(ww * hh, ew * eh)
-            if min_area > 0 and overlap_area > 0.3 * min_area:
-                is_dup = True
-                break
-        if not is_dup:
-            filtered.append((x, y, ww, hh))
+    rects = np.array([cv2.boundingRect(c) for c in cnts], dtype=np.int64).reshape(-1, 4)
+    rects[:, 1] += bottom_start
+    _add_non_overlapping(boxes, rects[(rects[:, 3] > 10) & (rects[:, 2] > 40)])
 
-    boxes = sorted(filtered, key=lambda b: b[1])
+    # dedupe (result is already in top-to-bottom order)
+    boxes = _dedupe_boxes(boxes)
 
     debug_with_boxes = debug_img.copy()
     segments: List[Dict[str, Any]] = []
@@ -498,7 +632,7 @@ def extract_by_regions(image: np.ndarray, debug_img: np.ndarray) -> Tuple[List[D
         text = ""
         for psm in (6, 4, 3):
             try:
-                text = pytesseract.image_to_string(region, config=f'--psm {psm} --oem 3')
+                text = image_to_string(region, psm)
                 if text.strip():
                     break
             except Exception:
@@ -514,7 +648,7 @@ def extract_by_regions(image: np.ndarray, debug_img: np.ndarray) -> Tuple[List[D
                 bin_img = g
             for psm in (6, 4, 3):
                 try:
-                    text = pytesseract.image_to_string(bin_img, config=f'--psm {psm} --oem 3')
+                    text = image_to_string(bin_img, psm)
                     if text.strip():
                         break
                 except Exception:
@@ -528,7 +662,7 @@ def extract_by_regions(image: np.ndarray, debug_img: np.ndarray) -> Tuple[List[D
             lap_counter += 1
         else:
             if text.strip():
-                lap_match = re.search(r"\b(\d{1,3})\b", text)
+                lap_match = _LAP_NUMBER_RE.search(text)
                 lap_num = int(lap_match.group(1)) if lap_match else lap_counter
                 segments.append({
                     "lap": lap_num,
@@ -558,50 +692,53 @@ def extract_by_regions(image: np.ndarray, debug_img: np.ndarray) -> Tuple[List[D
 def extract_swimming_data_v2(image: np.ndarray) -> Tuple[List[Dict[str, Any]], np.ndarray]:
     from ..image_processing.preprocessing import preprocess_for_small_text
 
-    processed, debug_img = preprocess_for_small_text(image)
+    processed, debug_img = preprocess_for_small_text(image, return_debug=True)
     all_candidates: List[Tuple[str, List[Dict[str, Any]], np.ndarray]] = []
 
-    try:
-        segments, dbg = extract_by_regions(image, debug_img)
-        if len(segments) >= 5:
-            segments = _postprocess_and_sort(segments)
-            return segments, dbg
-        elif len(segments) > 0:
-            all_candidates.append(("region", segments, dbg))
-    except Exception as e:
-        print(f"✗ Region extraction failed: {e}")
+    # region extraction OCRs every box; skip it when there are too few text rows
+    # for it to find 5 laps
+    if _count_text_rows(processed) >= REGION_MIN_TEXT_ROWS:
+        try:
+            segments, dbg = extract_by_regions(image, debug_img)
+            if len(segments) >= 5:
+                return segments, dbg
+            elif len(segments) > 0:
+                all_candidates.append(("region", segments, dbg))
+        except Exception as e:
+            print(f"✗ Region extraction failed: {e}")
 
     variants = [
         ("processed", processed),
         ("original_gray", cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image),
         ("inverted", cv2.bitwise_not(processed)),
-        ("enhanced", cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8)).apply(processed)),
+        ("enhanced", get_clahe(3.0).apply(processed)),
     ]
 
-    for name, img in variants:
-        for psm in (6, 4, 3, 11, 8, 13):
-            try:
-                data = pytesseract.image_to_data(img, output_type=Output.DICT, config=f'--psm {psm} --oem 3')
-                segs = parse_ocr_data_structured(data)
-                if len(segs) >= 5:
-                    segs = _postprocess_and_sort(segs)
-                    return segs, debug_img
-                elif len(segs) > 0:
-                    all_candidates.append((f"{name}_psm{psm}", segs, debug_img))
-            except Exception as e:
-                print(f"✗ {name} PSM {psm} failed: {e}")
-
-    for psm in (6, 4, 3, 11, 8):
-        try:
-            text = pytesseract.image_to_string(processed, config=f'--psm {psm} --oem 3')
-            segs = parse_text_simple(text)
-            if len(segs) >= 5:
-                segs = _postprocess_and_sort(segs)
-                return segs, debug_img
-            elif len(segs) > 0:
-                all_candidates.append((f"simple_psm{psm}", segs, debug_img))
-        except Exception as e:
-            print(f"✗ Simple PSM {psm} failed: {e}")
+    # (label, ocr call, image, psm, parser), in the order the answers are preferred
+    attempts = [
+        (f"{name}_psm{psm}", image_to_data, img, psm, parse_ocr_data_structured)
+        for name, img in variants for psm in (6, 4, 3, 11, 8, 13)
+    ] + [
+        (f"simple_psm{psm}", image_to_string, processed, psm, parse_text_simple)
+        for psm in (6, 4, 3, 11, 8)
+    ]
+
+    # Each attempt is its own tesseract subprocess, so run them side by side in waves of
+    # OCR_MAX_WORKERS; results are still consumed in order, so the first attempt with
+    # >= 5 laps wins, and no further wave is started once one has
+    with ThreadPoolExecutor(max_workers=OCR_MAX_WORKERS) as executor:
+        for wave_start in range(0, len(attempts), OCR_MAX_WORKERS):
+            wave = attempts[wave_start:wave_start + OCR_MAX_WORKERS]
+            futures = [executor.submit(ocr, img, psm) for _, ocr, img, psm, _ in wave]
+            for (label, _, _, _, parse), future in zip(wave, futures):
+                try:
+                    segs = parse(future.result())
+                    if len(segs) >= 5:
+                        return segs, debug_img
+                    elif len(segs) > 0:
+                        all_candidates.append((label, segs, debug_img))
+                except Exception as e:
+                    print(f"✗ {label} failed: {e}")
 
     if all_candidates:
         best = max(all_candidates, key=lambda x: len(x[1]))
@@ -646,8 +783,7 @@ def ocr_single_segment(segment_image: np.ndarray, segment_id: int, start_lap: in
         logger.warning(f"⚠️  Failed to preprocess: {e}")
 
     try:
-        clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-        enhanced = clahe.apply(gray)
+        enhanced = get_clahe(3.0).apply(gray)
         processed_variants.append(("enhanced", enhanced))
         denoised = cv2.fastNlMeansDenoising(gray)
         processed_variants.append(("denoised", denoised))
@@ -656,79 +792,93 @@ def ocr_single_segment(segment_image: np.ndarray, segment_id: int, start_lap: in
         logger.warning(f"⚠️  Failed to create enhanced variants: {e}")
 
     all_laps: List[Dict[str, Any]] = []
+    # OCR output that already failed to parse; PSMs and variants often agree on clean
+    # crops, and the parse of identical input cannot succeed the second time
+    failed_boxes: set = set()
+    failed_texts: set = set()
+
+    # one tesserocr handle for the whole sweep: each variant is uploaded once for all PSMs
+    with ocr_session():
+        for variant_name, img in processed_variants:
+            logger.debug(f"🔍 Trying variant: {variant_name}")
+            for psm in (6, 4, 3, 11, 8):
+                try:
+                    logger.debug(f"  → PSM {psm}: Running image_to_data...")
+                    data = image_to_data(img, psm)
+                    # the columns parse_ocr_data_structured reads
+                    boxes_sig = tuple(tuple(data.get(col, ())) for col in ("text", "left", "top", "height"))
+                    if boxes_sig in failed_boxes:
+                        logger.debug(f"  → PSM {psm}: Same word boxes as an earlier attempt, skipping parse")
+                        segs = []
+                    else:
+                        segs = parse_ocr_data_structured(data)
+                        logger.debug(f"  → PSM {psm}: Structured parsing found {len(segs)} segments")
+                        if not segs:
+                            failed_boxes.add(boxes_sig)
 
-    for variant_name, img in processed_variants:
-        logger.debug(f"🔍 Trying variant: {variant_name}")
-        for psm in (6, 4, 3, 11, 8):
-            try:
-                logger.debug(f"  → PSM {psm}: Running image_to_data...")
-                data = pytesseract.image_to_data(img, output_type=Output.DICT, config=f'--psm {psm} --oem 3')
-                segs = parse_ocr_data_structured(data)
-                logger.debug(f"  → PSM {psm}: Structured parsing found {len(segs)} segments")
-
-                if segs:
-                    segs = _postprocess_and_sort(segs)
-                    for i, s in enumerate(segs):
-                        s["lap"] = start_lap + i
-                        s["duration"] = seconds_to_mmss(s.pop("duration_sec", 90))
-                        s["pace_per_100m"] = seconds_to_mmss(s.pop("pace_per_100m_sec", 120))
-                        all_laps.append(s)
-                    if all_laps:
-                        logger.info(f"✅ SUCCESS with {variant_name} PSM {psm}: {len(all_laps)} laps found")
-                        logger.debug(f"Laps data: {all_laps}")
-                        return {"laps": all_laps, "total_laps": len(all_laps)}
-
-                logger.debug(f"  → PSM {psm}: Running image_to_string...")
-                text = pytesseract.image_to_string(img, config=f'--psm {psm} --oem 3')
-                logger.debug(f"  → PSM {psm}: OCR text length: {len(text)} chars")
-                logger.debug(f"  → PSM {psm}: OCR text preview: {text[:200]}")
-
-                if text.strip():
-                    lines = [l.strip() for l in text.splitlines() if l.strip()]
-                    logger.debug(f"  → PSM {psm}: {len(lines)} lines after cleanup")
-                    tmp: List[Dict[str, Any]] = []
-                    for i, _line in enumerate(lines):
-                        ctx = "\n".join(lines[max(0, i - 1):min(len(lines), i + 3)])
-                        has_strokes = bool(re.search(r"\bStrokes?\b", ctx, re.IGNORECASE))
-                        has_swolf = bool(re.search(r"\bSWOLF\b", ctx, re.IGNORECASE))
-
-                        if not (has_strokes and has_swolf):
-                            continue
-
-                        logger.debug(f"    Line {i}: Found Strokes & SWOLF markers")
-                        lap_m = re.search(r"^\s*(\d{1,3})\b", _line)
-                        lap_num = int(lap_m.group(1)) if lap_m else (start_lap + len(tmp))
-                        seg = parse_segment_text(ctx, lap_num)
-                        if seg:
-                            logger.debug(f"    Line {i}: Parsed segment - lap={seg.get('lap')}, stroke={seg.get('stroke_type')}")
-                            tmp.append(seg)
-
-                    if tmp:
-                        logger.debug(f"  → PSM {psm}: Parsed {len(tmp)} segments from text")
-                        tmp = _postprocess_and_sort(tmp)
-                        for i, s in enumerate(tmp):
+                    if segs:
+                        for i, s in enumerate(segs):
                             s["lap"] = start_lap + i
                             s["duration"] = seconds_to_mmss(s.pop("duration_sec", 90))
                             s["pace_per_100m"] = seconds_to_mmss(s.pop("pace_per_100m_sec", 120))
                             all_laps.append(s)
-                        logger.info(f"✅ SUCCESS with {variant_name} PSM {psm} text parsing: {len(all_laps)} laps")
-                        logger.debug(f"Laps data: {all_laps}")
-                        return {"laps": all_laps, "total_laps": len(all_laps)}
-
-                    logger.debug(f"  → PSM {psm}: Trying single segment parse...")
-                    single = parse_segment_text(text, start_lap)
-                    if single:
-                        logger.info(f"✅ SUCCESS with {variant_name} PSM {psm} single parse")
-                        single["duration"] = seconds_to_mmss(single.pop("duration_sec", 90))
-                        single["pace_per_100m"] = seconds_to_mmss(single.pop("pace_per_100m_sec", 120))
-                        logger.debug(f"Single lap data: {single}")
-                        return {"laps": [single], "total_laps": 1}
-                    else:
-                        logger.debug(f"  → PSM {psm}: Single parse returned None (missing Strokes/SWOLF)")
-
-            except Exception as e:
-                logger.warning(f"  → PSM {psm}: Exception during OCR: {type(e).__name__}: {e}")
-                continue
+                        if all_laps:
+                            logger.info(f"✅ SUCCESS with {variant_name} PSM {psm}: {len(all_laps)} laps found")
+                            logger.debug(f"Laps data: {all_laps}")
+                            return {"laps": all_laps, "total_laps": len(all_laps)}
+
+                    logger.debug(f"  → PSM {psm}: Running image_to_string...")
+                    text = image_to_string(img, psm)
+                    logger.debug(f"  → PSM {psm}: OCR text length: {len(text)} chars")
+                    logger.debug(f"  → PSM {psm}: OCR text preview: {text[:200]}")
+
+                    if text in failed_texts:
+                        logger.debug(f"  → PSM {psm}: Same text as an earlier attempt, skipping parse")
+                    elif text.strip():
+                        lines = [l.strip() for l in text.splitlines() if l.strip()]
+                        logger.debug(f"  → PSM {psm}: {len(lines)} lines after cleanup")
+                        tmp: List[Dict[str, Any]] = []
+                        for i in _label_window_starts(lines, 1, 3):
+                            _line = lines[i]
+                            ctx = "\n".join(lines[max(0, i - 1):i + 3])
+                            if not _has_metric_labels(ctx):
+                                continue
+
+                            logger.debug(f"    Line {i}: Found Strokes & SWOLF markers")
+                            lap_m = _LEADING_LAP_NUMBER_RE.search(_line)
+                            lap_num = int(lap_m.group(1)) if lap_m else (start_lap + len(tmp))
+                            seg = parse_segment_text(ctx, lap_num)
+                            if seg:
+                                logger.debug(f"    Line {i}: Parsed segment - lap={seg.get('lap')}, stroke={seg.get('stroke_type')}")
+                                tmp.append(seg)
+
+                        if tmp:
+                            logger.debug(f"  → PSM {psm}: Parsed {len(tmp)} segments from text")
+                            tmp = _postprocess_and_sort(tmp)
+                            for i, s in enumerate(tmp):
+                                s["lap"] = start_lap + i
+                                s["duration"] = seconds_to_mmss(s.pop("duration_sec", 90))
+                                s["pace_per_100m"] = seconds_to_mmss(s.pop("pace_per_100m_sec", 120))
+                                all_laps.append(s)
+                            logger.info(f"✅ SUCCESS with {variant_name} PSM {psm} text parsing: {len(all_laps)} laps")
+                            logger.debug(f"Laps data: {all_laps}")
+                            return {"laps": all_laps, "total_laps": len(all_laps)}
+
+                        logger.debug(f"  → PSM {psm}: Trying single segment parse...")
+                        single = parse_segment_text(text, start_lap)
+                        if single:
+                            logger.info(f"✅ SUCCESS with {variant_name} PSM {psm} single parse")
+                            single["duration"] = seconds_to_mmss(single.pop("duration_sec", 90))
+                            single["pace_per_100m"] = seconds_to_mmss(single.pop("pace_per_100m_sec", 120))
+                            logger.debug(f"Single lap data: {single}")
+                            return {"laps": [single], "total_laps": 1}
+                        else:
+                            logger.debug(f"  → PSM {psm}: Single parse returned None (missing Strokes/SWOLF)")
+                            failed_texts.add(text)
+
+                except Exception as e:
+                    logger.warning(f"  → PSM {psm}: Exception during OCR: {type(e).__name__}: {e}")
+                    continue
 
     logger.error(f"❌ FALLBACK: All OCR attempts failed for segment {segment_id}")
     logger.error(f"   Tried {len(processed_variants)} variants x 5 PSM modes = {len(processed_variants) * 5} attempts")
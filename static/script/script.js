@@ -119,6 +119,8 @@ function displaySegmentImages(segments) {
     });
 }
 
+const OCR_CONCURRENCY = 4;
+
 async function processExtraction() {
     if (!segmentImages.length) { showError('Please split the image first'); return; }
     const loading = document.getElementById('loading');
@@ -129,19 +131,37 @@ async function processExtraction() {
     hideError(); hideSuccess();
 
     try {
-        loading.querySelector('p').textContent = 'Processing segments one by one...';
+        loading.querySelector('p').textContent = 'Processing segments...';
         processedSegments = [];
         let globalLapCounter = 1;
 
+        // OCR segments concurrently (bounded), then number laps in segment order
+        const ocrResults = new Array(segmentImages.length).fill(null);
+        let nextIndex = 0;
+        let doneCount = 0;
+        const worker = async () => {
+            while (nextIndex < segmentImages.length) {
+                const i = nextIndex++;
+                const seg = segmentImages[i];
+                if (seg.failed) continue;
+                try {
+                    const ocrResponse = await fetch(`/api/ocr-segment/${seg.id}`, { method: 'POST' });
+                    ocrResults[i] = { ok: ocrResponse.ok, body: await ocrResponse.json() };
+                } catch {
+                    ocrResults[i] = { ok: false, body: null };
+                }
+                doneCount++;
+                loading.querySelector('p').textContent = `Processed ${doneCount}/${segmentImages.length} segments...`;
+            }
+        };
+        await Promise.all(Array.from({ length: Math.min(OCR_CONCURRENCY, segmentImages.length) }, worker));
+
         for (let i = 0; i < segmentImages.length; i++) {
-            const seg = segmentImages[i];
-            loading.querySelector('p').textContent = `Processing segment ${i + 1}/${segmentImages.length}...`;
-            if (seg.failed) continue;
+            if (segmentImages[i].failed) continue;
 
             try {
-                const ocrResponse = await fetch(`/api/ocr-segment/${seg.id}`, { method: 'POST' });
-                const ocrResult = await ocrResponse.json();
-                if (ocrResponse.ok) {
+                const { ok, body: ocrResult } = ocrResults[i];
+                if (ok) {
                     if (ocrResult.segment.laps && Array.isArray(ocrResult.segment.laps)) {
                         const segmentLaps = ocrResult.segment.laps.map(lap => ({ ...lap, lap: globalLapCounter++ }));
                         processedSegments.push(...segmentLaps);